@@ -0,0 +1,43 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Optional SIMD compositing kernel for the invisibility cloak.
+
+Built on first import through pyximport (see cloak_kernels.pyxbld), or
+ahead of time with Cython. The C implementation lives in
+cloak_kernels_simd.h and picks AVX2 or SSE4.1 at runtime; ISA is "scalar"
+when neither is available, and the app then does not use this module.
+"""
+
+from libc.stdint cimport uint8_t
+
+cdef extern from "cloak_kernels_simd.h":
+    const char *cloak_composite_isa()
+    void cloak_composite(const uint8_t *frame, const uint8_t *background,
+                         const uint8_t *mask, uint8_t *out, size_t n) nogil
+
+ISA = cloak_composite_isa().decode("ascii")
+
+def composite(frame, background, mask, out):
+    """Write background where mask is set and frame elsewhere into out
+
+    frame, background and out are C-contiguous (H, W, 3) uint8 arrays and
+    mask is a C-contiguous (H, W) uint8 array. Returns out.
+    """
+    cdef const uint8_t[:, :, ::1] frame_view = frame
+    cdef const uint8_t[:, :, ::1] background_view = background
+    cdef const uint8_t[:, ::1] mask_view = mask
+    cdef uint8_t[:, :, ::1] out_view = out
+    cdef Py_ssize_t height = mask_view.shape[0]
+    cdef Py_ssize_t width = mask_view.shape[1]
+    cdef size_t n = height * width
+
+    if not (frame_view.shape[0] == background_view.shape[0] == out_view.shape[0] == height and
+            frame_view.shape[1] == background_view.shape[1] == out_view.shape[1] == width and
+            frame_view.shape[2] == background_view.shape[2] == out_view.shape[2] == 3):
+        raise ValueError("frame, background and out must be (H, W, 3) matching the (H, W) mask")
+
+    if n:
+        with nogil:
+            cloak_composite(&frame_view[0, 0, 0], &background_view[0, 0, 0],
+                            &mask_view[0, 0], &out_view[0, 0, 0], n)
+    return out
@@ -0,0 +1,132 @@
+/*
+ * SIMD compositing kernel for the invisibility cloak.
+ *
+ * out[i] = mask[i] ? background[i] : frame[i] for n BGR pixels. The mask is
+ * one byte per pixel; each mask byte is expanded to the 3 channel bytes of its
+ * pixel with byte shuffles, then the frames are blended 32 (AVX2) or 16
+ * (SSE4.1) pixels at a time. The instruction set is picked at runtime and a
+ * scalar loop handles the tail. Without AVX2/SSE4.1 (non-x86 CPUs, MSVC)
+ * cloak_composite_isa() reports "scalar" and the app composites with OpenCV
+ * instead: the per-pixel loop on its own is slower than cv2.copyTo.
+ */
+#ifndef CLOAK_KERNELS_SIMD_H
+#define CLOAK_KERNELS_SIMD_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+#if (defined(__GNUC__) || defined(__clang__)) && (defined(__x86_64__) || defined(__i386__))
+#define CLOAK_X86_DISPATCH 1
+#include <immintrin.h>
+#endif
+
+static void cloak_composite_scalar(const uint8_t *frame, const uint8_t *background,
+                                   const uint8_t *mask, uint8_t *out, size_t n)
+{
+    size_t i;
+    for (i = 0; i < n; ++i) {
+        const uint8_t *src = mask[i] ? background + 3 * i : frame + 3 * i;
+        out[3 * i] = src[0];
+        out[3 * i + 1] = src[1];
+        out[3 * i + 2] = src[2];
+    }
+}
+
+#ifdef CLOAK_X86_DISPATCH
+/* Byte i of 16 mask bytes -> channel bytes 0..15, 16..31 and 32..47 */
+#define CLOAK_EXPAND_0 0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5
+#define CLOAK_EXPAND_1 5, 5, 6, 6, 6, 7, 7, 7, 8, 8, 8, 9, 9, 9, 10, 10
+#define CLOAK_EXPAND_2 10, 11, 11, 11, 12, 12, 12, 13, 13, 13, 14, 14, 14, 15, 15, 15
+
+__attribute__((target("avx2")))
+static size_t cloak_composite_avx2(const uint8_t *frame, const uint8_t *background,
+                                   const uint8_t *mask, uint8_t *out, size_t n)
+{
+    const __m256i zero = _mm256_setzero_si256();
+    const __m256i expand_a = _mm256_setr_epi8(CLOAK_EXPAND_0, CLOAK_EXPAND_1);
+    const __m256i expand_b = _mm256_setr_epi8(CLOAK_EXPAND_2, CLOAK_EXPAND_0);
+    const __m256i expand_c = _mm256_setr_epi8(CLOAK_EXPAND_1, CLOAK_EXPAND_2);
+    size_t i = 0;
+
+    for (; i + 32 <= n; i += 32) {
+        /* 0xFF for pixels to take from the background */
+        __m256i m = _mm256_loadu_si256((const __m256i *)(mask + i));
+        m = _mm256_andnot_si256(_mm256_cmpeq_epi8(m, zero), _mm256_set1_epi8(-1));
+
+        /* Pixels 0-15 live in the low lane, 16-31 in the high lane */
+        __m128i lo = _mm256_castsi256_si128(m);
+        __m128i hi = _mm256_extracti128_si256(m, 1);
+        __m256i sel[3];
+        sel[0] = _mm256_shuffle_epi8(_mm256_broadcastsi128_si256(lo), expand_a);
+        sel[1] = _mm256_shuffle_epi8(
+            _mm256_inserti128_si256(_mm256_castsi128_si256(lo), hi, 1), expand_b);
+        sel[2] = _mm256_shuffle_epi8(_mm256_broadcastsi128_si256(hi), expand_c);
+
+        const size_t base = 3 * i;
+        int k;
+        for (k = 0; k < 3; ++k) {
+            __m256i f = _mm256_loadu_si256((const __m256i *)(frame + base + 32 * k));
+            __m256i b = _mm256_loadu_si256((const __m256i *)(background + base + 32 * k));
+            _mm256_storeu_si256((__m256i *)(out + base + 32 * k),
+                                _mm256_blendv_epi8(f, b, sel[k]));
+        }
+    }
+    return i;
+}
+
+__attribute__((target("sse4.1")))
+static size_t cloak_composite_sse41(const uint8_t *frame, const uint8_t *background,
+                                    const uint8_t *mask, uint8_t *out, size_t n)
+{
+    const __m128i zero = _mm_setzero_si128();
+    const __m128i expand[3] = {
+        _mm_setr_epi8(CLOAK_EXPAND_0),
+        _mm_setr_epi8(CLOAK_EXPAND_1),
+        _mm_setr_epi8(CLOAK_EXPAND_2)
+    };
+    size_t i = 0;
+
+    for (; i + 16 <= n; i += 16) {
+        __m128i m = _mm_loadu_si128((const __m128i *)(mask + i));
+        m = _mm_andnot_si128(_mm_cmpeq_epi8(m, zero), _mm_set1_epi8(-1));
+
+        const size_t base = 3 * i;
+        int k;
+        for (k = 0; k < 3; ++k) {
+            __m128i sel = _mm_shuffle_epi8(m, expand[k]);
+            __m128i f = _mm_loadu_si128((const __m128i *)(frame + base + 16 * k));
+            __m128i b = _mm_loadu_si128((const __m128i *)(background + base + 16 * k));
+            _mm_storeu_si128((__m128i *)(out + base + 16 * k), _mm_blendv_epi8(f, b, sel));
+        }
+    }
+    return i;
+}
+#endif /* CLOAK_X86_DISPATCH */
+
+/* Name of the code path cloak_composite() will use on this CPU */
+static const char *cloak_composite_isa(void)
+{
+#ifdef CLOAK_X86_DISPATCH
+    if (__builtin_cpu_supports("avx2"))
+        return "avx2";
+    if (__builtin_cpu_supports("sse4.1"))
+        return "sse4.1";
+#endif
+    return "scalar";
+}
+
+static void cloak_composite(const uint8_t *frame, const uint8_t *background,
+                            const uint8_t *mask, uint8_t *out, size_t n)
+{
+    size_t done = 0;
+#ifdef CLOAK_X86_DISPATCH
+    if (__builtin_cpu_supports("avx2"))
+        done = cloak_composite_avx2(frame, background, mask, out, n);
+    else if (__builtin_cpu_supports("sse4.1"))
+        done = cloak_composite_sse41(frame, background, mask, out, n);
+#endif
+    cloak_composite_scalar(frame + 3 * done, background + 3 * done, mask + done,
+                           out + 3 * done, n - done);
+}
+
+#endif /* CLOAK_KERNELS_SIMD_H */
@@ -5,9 +5,9 @@ Harry Potter Invisibility Cloak (OpenCV + NumPy)
 Features:
   • Real-time webcam capture with mirror effect
   • HSV-based color detection for the cloak (multiple color presets)
-  • Advanced noise removal with morphological operations
+  • Advanced noise removal with morphology and small-blob filtering
   • Smart background capture with averaging and visual feedback
-  • Bitwise compositing for realistic cloaking effect
+  • Single-pass mask compositing for realistic cloaking effect
   • On-screen HUD with FPS, status, and controls
   • Video recording with timestamp
   • Real-time HSV tuner for custom color calibration
@@ -23,6 +23,7 @@ Keyboard Controls:
 
 Setup Instructions:
   1. Install dependencies: pip install opencv-python numpy
+     (optional: pip install numba for the experimental --numba mask kernel)
   2. Run: python invisibility_cloak.py
   3. Position camera and press 'b' to capture background
   4. Put on red cloth/shirt and watch the magic happen!
@@ -38,33 +39,173 @@ Author: Enhanced for GitHub
 Version: 2.0
 """
 
+import os
+
+# OpenCV reads its thread-pool size at import time; respect any user override
+_CPU_COUNT = os.cpu_count() or 1
+os.environ.setdefault("OPENCV_FOR_THREADS_NUM", str(_CPU_COUNT))
+os.environ.setdefault("OMP_NUM_THREADS", str(_CPU_COUNT))
+
 import cv2
 import numpy as np
 import time
 import json
-import os
-from collections import deque
+import queue
+import sys
+import threading
 from datetime import datetime
 
+def _import_cloak_kernels():
+    """Import the optional SIMD composite kernel (cloak_kernels.pyx)
+
+    Uses a prebuilt module if there is one, otherwise compiles it through
+    pyximport when Cython and a C compiler are available. Compiler output is
+    discarded so a missing toolchain doesn't print a build log on every launch.
+    Returns None when the kernel is unavailable or has no SIMD path for this
+    CPU/compiler (its scalar loop is slower than cv2.copyTo).
+    """
+    try:
+        import cloak_kernels
+    except ImportError:
+        try:
+            import pyximport
+        except ImportError:
+            return None
+        
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_fds = [os.dup(1), os.dup(2)]
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        _pyx_importers = pyximport.install(language_level=3)
+        try:
+            os.dup2(devnull, 1)
+            os.dup2(devnull, 2)
+            import cloak_kernels
+        except ImportError:
+            return None
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for fd, saved in zip((1, 2), saved_fds):
+                os.dup2(saved, fd)
+                os.close(saved)
+            os.close(devnull)
+            pyximport.uninstall(*_pyx_importers)
+    
+    if cloak_kernels.ISA == "scalar":
+        return None
+    return cloak_kernels
+
+cloak_kernels = _import_cloak_kernels()
+
 # ---------------------- FPS Counter Utility ----------------------
 class FPSCounter:
-    """Efficient FPS counter with rolling average"""
-    def __init__(self, buffer_size=30):
-        self.frame_times = deque(maxlen=buffer_size)
+    """Efficient FPS counter with an exponential moving average of frame time"""
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self.avg_frame_time = None
         self.last_time = None
 
     def update(self):
         current_time = time.perf_counter()
         if self.last_time is not None:
             frame_time = current_time - self.last_time
-            self.frame_times.append(frame_time)
+            if self.avg_frame_time is None:
+                self.avg_frame_time = frame_time
+            else:
+                self.avg_frame_time += self.smoothing * (frame_time - self.avg_frame_time)
         self.last_time = current_time
 
     def get_fps(self):
-        if not self.frame_times:
+        if not self.avg_frame_time:
             return 0.0
-        avg_frame_time = sum(self.frame_times) / len(self.frame_times)
-        return 1.0 / avg_frame_time if avg_frame_time > 0 else 0.0
+        return 1.0 / self.avg_frame_time
+
+# ---------------------- OpenCV Parallelism ----------------------
+# Make sure the optimized (SIMD/IPP) code paths and parallel loops are on.
+# One core is left for the capture thread, which mostly sleeps in the camera
+# driver; the recording encoder thread competes with OpenCV while recording.
+cv2.setUseOptimized(True)
+cv2.setNumThreads(max(2, _CPU_COUNT - 1))
+
+# ---------------------- Threaded Capture & Recording ----------------------
+
+class CameraGrabber(threading.Thread):
+    """Reads the camera on a background thread, keeping only the latest frame"""
+    def __init__(self, cap):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.latest = None
+        self.lock = threading.Condition()
+        self.is_running = False
+        self._frame_id = 0
+        self._served_id = 0
+
+    def start(self):
+        self.is_running = True
+        super().start()
+
+    def run(self):
+        while self.is_running:
+            # cap.read() allocates a new array each call, so frames already
+            # handed out by read() are never overwritten by this thread
+            ret, frame = self.cap.read()
+            with self.lock:
+                if not ret:
+                    self.is_running = False
+                else:
+                    self.latest = frame
+                    self._frame_id += 1
+                self.lock.notify_all()
+
+    def read(self, timeout=None):
+        """Wait for a frame newer than the last one returned (like cap.read())"""
+        with self.lock:
+            self.lock.wait_for(
+                lambda: self._frame_id != self._served_id or not self.is_running, timeout)
+            if self._frame_id == self._served_id:
+                return False, None
+            self._served_id = self._frame_id
+            return True, self.latest
+
+    def stop(self):
+        """Stop the capture thread and wait for it to exit"""
+        with self.lock:
+            self.is_running = False
+            self.lock.notify_all()
+        if self.is_alive():
+            self.join(timeout=1.0)
+
+class RecordingWriter(threading.Thread):
+    """Encodes frames to a cv2.VideoWriter on a background thread"""
+    def __init__(self, video_writer, max_pending=4):
+        super().__init__(daemon=True)
+        self.video_writer = video_writer
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.dropped_frames = 0
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            self.video_writer.write(frame)
+
+    def write(self, frame):
+        """Queue a copy of the frame; drops it rather than stall the display loop"""
+        try:
+            self.queue.put_nowait(frame.copy())
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def release(self):
+        """Flush pending frames, close the underlying writer and report drops"""
+        self.queue.put(None)
+        self.join()
+        self.video_writer.release()
+        if self.dropped_frames:
+            print(f"⚠️  Dropped {self.dropped_frames} frames while recording "
+                  "(encoder could not keep up)")
 
 # ---------------------- HSV Color Presets ----------------------
 # Note: OpenCV uses H: 0-179, S,V: 0-255
@@ -97,13 +238,131 @@ COLOR_PRESETS = {
     }
 }
 
+def aligned_empty(shape, dtype=np.uint8, align=64):
+    """np.empty whose data pointer is aligned to `align` bytes (for aligned SIMD loads)"""
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    buf = np.empty(nbytes + align, np.uint8)
+    offset = (-buf.ctypes.data) % align
+    return buf[offset:offset + nbytes].view(dtype).reshape(shape)
+
+def _stack_ranges(ranges):
+    """Stack (lower, upper) HSV pairs into two (K, 3) int32 arrays"""
+    lowers = np.array([lower for lower, _ in ranges], dtype=np.int32)
+    uppers = np.array([upper for _, upper in ranges], dtype=np.int32)
+    return lowers, uppers
+
+def _to_scalar(bound):
+    """Convert an HSV bound array to the 4-tuple scalar cv2.cuda expects"""
+    return (float(bound[0]), float(bound[1]), float(bound[2]), 0.0)
+
+def _cuda_in_range(src, lower, upper, dst):
+    """cv2.cuda.inRange with the same (src, lower, upper, dst) call shape as cv2.inRange"""
+    return cv2.cuda.inRange(src, _to_scalar(lower), _to_scalar(upper), dst)
+
+def _union_of_ranges(hsv, ranges, dst=None, scratch=None,
+                     in_range=cv2.inRange, bitwise_or=cv2.bitwise_or):
+    """OR together the inRange masks of all (lower, upper) pairs into dst
+
+    dst and scratch may be preallocated buffers (ndarray or GpuMat) or None
+    (UMat); the backend's inRange/bitwise_or are passed in so the CPU, CUDA
+    and OpenCL paths share one loop.
+    """
+    (lower, upper), *extra_ranges = ranges
+    dst = in_range(hsv, lower, upper, dst)
+    for extra_lower, extra_upper in extra_ranges:
+        scratch = in_range(hsv, extra_lower, extra_upper, scratch)
+        dst = bitwise_or(dst, scratch, dst=dst)
+    return dst
+
+def _shares_sv_bounds(ranges):
+    """True if all ranges differ only in hue (S/V bounds are identical)"""
+    lower, upper = ranges[0]
+    return all(np.array_equal(lo[1:], lower[1:]) and np.array_equal(up[1:], upper[1:])
+               for lo, up in ranges)
+
+def _plane_range(plane, low, high, dst):
+    """Single-channel range test; a plain compare when the upper bound is open"""
+    if high >= 255:
+        return cv2.compare(plane, low, cv2.CMP_GE, dst=dst)
+    return cv2.inRange(plane, low, high, dst=dst)
+
+# ---------------------- Fused BGR -> Mask Kernel ----------------------
+_numba_kernel = None
+
+def _load_numba_kernel():
+    """Import numba and compile the fused mask kernel on first use
+
+    Numba is optional and only needed for --numba, so neither the import nor
+    the kernel definition is paid for at startup. Returns None when numba is
+    not installed.
+    """
+    global _numba_kernel
+    if _numba_kernel is not None:
+        return _numba_kernel
+    try:
+        from numba import njit, prange
+    except ImportError:
+        return None
+    
+    # Fixed-point division tables used by OpenCV's 8-bit BGR2HSV conversion
+    HSV_SHIFT = 12
+    SDIV_TABLE = np.zeros(256, dtype=np.int32)
+    HDIV_TABLE = np.zeros(256, dtype=np.int32)
+    SDIV_TABLE[1:] = np.round((255 << HSV_SHIFT) / np.arange(1, 256))
+    HDIV_TABLE[1:] = np.round((180 << HSV_SHIFT) / (6.0 * np.arange(1, 256)))
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def bgr_range_mask(frame, lowers, uppers, out_mask):
+        """Compute HSV inline and test it against K ranges in a single pass
+
+        Equivalent to cvtColor(BGR2HSV) + inRange per range + bitwise_or,
+        without materializing the intermediate HSV frame. The per-pixel
+        branches don't vectorize, so OpenCV's SIMD path is usually faster;
+        this kernel is only used when requested with --numba.
+        """
+        height, width = out_mask.shape
+        round_half = 1 << (HSV_SHIFT - 1)
+        for y in prange(height):
+            for x in range(width):
+                b = np.int32(frame[y, x, 0])
+                g = np.int32(frame[y, x, 1])
+                r = np.int32(frame[y, x, 2])
+
+                v = max(b, g, r)
+                diff = v - min(b, g, r)
+                s = (diff * SDIV_TABLE[v] + round_half) >> HSV_SHIFT
+
+                if v == r:
+                    h = g - b
+                elif v == g:
+                    h = b - r + 2 * diff
+                else:
+                    h = r - g + 4 * diff
+                h = (h * HDIV_TABLE[diff] + round_half) >> HSV_SHIFT
+                if h < 0:
+                    h += 180
+
+                value = 0
+                for k in range(lowers.shape[0]):
+                    if (lowers[k, 0] <= h <= uppers[k, 0] and
+                            lowers[k, 1] <= s <= uppers[k, 1] and
+                            lowers[k, 2] <= v <= uppers[k, 2]):
+                        value = 255
+                        break
+                out_mask[y, x] = value
+        return out_mask
+
+    _numba_kernel = bgr_range_mask
+    return bgr_range_mask
+
 # ---------------------- Real-time HSV Tuner ----------------------
 class HSVTuner:
     """Interactive HSV range tuner with trackbars"""
-    def __init__(self, window_name="HSV Tuner"):
+    def __init__(self, window_name="HSV Tuner", on_change=None):
         self.window_name = window_name
         self.is_active = False
         self.is_initialized = False
+        self.on_change = on_change  # Called whenever the active HSV range changes
 
     def toggle(self):
         """Toggle the HSV tuner window"""
@@ -113,6 +372,13 @@ class HSVTuner:
             self._create_window()
         elif not self.is_active and self.is_initialized:
             cv2.destroyWindow(self.window_name)
+            self.is_initialized = False  # Trackbars die with the window
+        
+        self._notify_change()
+
+    def _notify_change(self, _=None):
+        if self.on_change is not None:
+            self.on_change()
 
     def _create_window(self):
         """Create trackbar window with default values"""
@@ -125,26 +391,32 @@ class HSVTuner:
             ("H_Max", 179, 10), ("S_Max", 255, 255), ("V_Max", 255, 255)
         ]
         
+        # Range arrays reused by get_hsv_range (filled in place)
+        self._lower = np.empty(3, np.uint8)
+        self._upper = np.empty(3, np.uint8)
+        
         for name, max_val, default in trackbars:
-            cv2.createTrackbar(name, self.window_name, default, max_val, lambda x: None)
+            cv2.createTrackbar(name, self.window_name, default, max_val, self._notify_change)
         
         self.is_initialized = True
 
     def get_hsv_range(self):
-        """Get current HSV range from trackbars"""
+        """Get current HSV range from trackbars
+
+        Returns the tuner's cached arrays, updated in place on every call.
+        """
         if not self.is_active or not self.is_initialized:
             return None
         
-        h_min = cv2.getTrackbarPos("H_Min", self.window_name)
-        s_min = cv2.getTrackbarPos("S_Min", self.window_name)
-        v_min = cv2.getTrackbarPos("V_Min", self.window_name)
-        h_max = cv2.getTrackbarPos("H_Max", self.window_name)
-        s_max = cv2.getTrackbarPos("S_Max", self.window_name)
-        v_max = cv2.getTrackbarPos("V_Max", self.window_name)
+        # getTrackbarPos returns -1 if the window was closed from the title bar
+        self._lower[0] = max(0, cv2.getTrackbarPos("H_Min", self.window_name))
+        self._lower[1] = max(0, cv2.getTrackbarPos("S_Min", self.window_name))
+        self._lower[2] = max(0, cv2.getTrackbarPos("V_Min", self.window_name))
+        self._upper[0] = max(0, cv2.getTrackbarPos("H_Max", self.window_name))
+        self._upper[1] = max(0, cv2.getTrackbarPos("S_Max", self.window_name))
+        self._upper[2] = max(0, cv2.getTrackbarPos("V_Max", self.window_name))
         
-        lower = np.array([h_min, s_min, v_min])
-        upper = np.array([h_max, s_max, v_max])
-        return (lower, upper)
+        return (self._lower, self._upper)
 
     def save_settings(self, filename="custom_hsv.json"):
         """Save current HSV settings to file"""
@@ -172,11 +444,13 @@ class HSVTuner:
 
 # ---------------------- Main Invisibility Cloak Class ----------------------
 class InvisibilityCloak:
-    def __init__(self, camera_index=0, width=1280, height=720):
+    def __init__(self, camera_index=0, width=1280, height=720, use_gpu=False,
+                 temporal_filter=False, use_opencl=False, use_numba=False):
         self.cap = None
+        self.grabber = None
         self.background = None
         self.fps_counter = FPSCounter()
-        self.hsv_tuner = HSVTuner()
+        self.hsv_tuner = HSVTuner(on_change=self._rebuild_mask_fn)
         
         # Video recording
         self.video_writer = None
@@ -186,8 +460,72 @@ class InvisibilityCloak:
         self.color_names = list(COLOR_PRESETS.keys())
         self.current_color_index = 0
         
-        # Morphological kernel (cached for performance)
-        self.morph_kernel = np.ones((3, 3), np.uint8)
+        # Static part of the HUD, rendered once
+        self._build_static_hud()
+        
+        # Morphological kernel for full-resolution masks (cached for performance)
+        self.morph_kernel5 = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+        
+        # Blobs smaller than this (in full-resolution pixels) are dropped from the mask
+        self.min_blob_area = 500
+        
+        # The mask is built at 1/mask_scale resolution and upsampled for compositing
+        self.mask_scale = 2
+        
+        # Opening kernel scaled to the mask resolution (3x3 at half resolution),
+        # so refinement strength matches a 5x5 opening at full resolution
+        mask_kernel_size = max(3, int(round(5 / self.mask_scale)) | 1)
+        self.mask_morph_kernel = cv2.getStructuringElement(
+            cv2.MORPH_RECT, (mask_kernel_size, mask_kernel_size))
+        
+        # Optional temporal mask filter, used instead of morphology (see smooth_mask)
+        self.temporal_filter = temporal_filter
+        self.temporal_weight = 0.5     # Weight of the current frame's mask
+        self.temporal_threshold = 160  # A new pixel must persist two frames to pass
+        
+        # Cheap 1/probe_scale presence check: skip the pipeline if the cloak isn't visible
+        self.probe_scale = 8
+        
+        # Opt-in fused Numba mask kernel (OpenCV's SIMD path is the default)
+        self._bgr_range_mask = _load_numba_kernel() if use_numba else None
+        self.use_numba = self._bgr_range_mask is not None
+        if use_numba and not self.use_numba:
+            print("⚠️  --numba requested but numba is not installed - using OpenCV masks")
+        
+        # Mask builder specialized for the active color (see _rebuild_mask_fn)
+        self._active_ranges = None
+        self._mask_fn = None
+        self._rebuild_mask_fn()
+        
+        self._flipped = None
+        self._frame_small = None
+        self._hsv = None
+        self._hsv_planes = None
+        self._mask_buf = None
+        self._mask_tmp = None
+        self._labels = None
+        self._refined_buf = None
+        self._mask_prev = None
+        self._mask_ema = None
+        self._mask_full = None
+        self._result = None
+        self._probe_small = None
+        self._probe_hsv = None
+        self._probe_mask = None
+        
+        # Optional CUDA pipeline (falls back to the CPU path when unavailable)
+        self._gpu = None
+        self._gpu_morph = None
+        self._gpu_background = None
+        if use_gpu:
+            self._initialize_gpu()
+        
+        # Optional OpenCL pipeline through OpenCV's transparent API (UMat)
+        self._use_opencl = False
+        self._umat_background = None
+        self._umat_background_source = None
+        if use_opencl and self._gpu is None:
+            self._initialize_opencl()
         
         # Initialize camera
         self._initialize_camera(camera_index, width, height)
@@ -195,11 +533,23 @@ class InvisibilityCloak:
     def _initialize_camera(self, camera_index, width, height):
         """Initialize camera with error handling"""
         try:
-            self.cap = cv2.VideoCapture(camera_index)
+            # Use the V4L2 backend explicitly on Linux, falling back to auto-detection
+            if sys.platform.startswith("linux"):
+                self.cap = cv2.VideoCapture(camera_index, cv2.CAP_V4L2)
+                if not self.cap.isOpened():
+                    self.cap = cv2.VideoCapture(camera_index)
+            else:
+                self.cap = cv2.VideoCapture(camera_index)
             
             if not self.cap.isOpened():
                 raise RuntimeError(f"Cannot open camera {camera_index}")
             
+            # Request MJPG before the resolution: far less USB bandwidth than YUYV
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            
+            # Keep only one frame queued in the driver to avoid latency buildup
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
             # Set camera properties
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
@@ -209,55 +559,181 @@ class InvisibilityCloak:
             actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             actual_fps = self.cap.get(cv2.CAP_PROP_FPS)
+            fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+            actual_format = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4))
+            
+            # Pre-allocate the per-frame working buffers
+            self._allocate_buffers(actual_height, actual_width)
+            
+            # Overlap capture with processing
+            self.grabber = CameraGrabber(self.cap)
+            self.grabber.start()
             
             print(f"📷 Camera initialized:")
             print(f"   Resolution: {actual_width}x{actual_height}")
             print(f"   FPS: {actual_fps}")
+            print(f"   Format: {actual_format}")
             print()
             
         except Exception as e:
             raise RuntimeError(f"Camera initialization failed: {e}")
 
-    def create_color_mask(self, hsv_frame):
-        """Create binary mask for the current cloak color"""
-        # Check if HSV tuner is active
-        if self.hsv_tuner.is_active:
-            hsv_range = self.hsv_tuner.get_hsv_range()
-            if hsv_range is not None:
-                lower, upper = hsv_range
-                return cv2.inRange(hsv_frame, lower, upper)
+    def _initialize_gpu(self):
+        """Create the cached CUDA buffers and filters, if a CUDA device is present"""
+        try:
+            has_cuda = cv2.cuda.getCudaEnabledDeviceCount() > 0
+        except (AttributeError, cv2.error):
+            has_cuda = False
         
-        # Use preset colors
-        current_color = self.color_names[self.current_color_index]
-        color_info = COLOR_PRESETS[current_color]
+        if not has_cuda:
+            print("⚠️  No CUDA-enabled OpenCV device found - using the CPU pipeline")
+            return False
+        
+        self._gpu = {
+            name: cv2.cuda_GpuMat()
+            for name in ("frame", "hsv", "mask", "mask_tmp", "refined", "background", "result")
+        }
+        self._gpu_morph = cv2.cuda.createMorphologyFilter(
+            cv2.MORPH_OPEN, cv2.CV_8UC1, self.morph_kernel5)
+        print("⚡ CUDA pipeline enabled (full-resolution mask, no blob filter)")
+        if self.temporal_filter:
+            print("⚠️  --temporal is not supported by the CUDA pipeline - using morphology instead")
+        return True
+
+    def _initialize_opencl(self):
+        """Enable OpenCV's OpenCL (T-API) dispatch, if an OpenCL device is present"""
+        if not cv2.ocl.haveOpenCL():
+            print("⚠️  No OpenCL device found - using the CPU pipeline")
+            return False
         
-        # Create mask from multiple ranges (for colors like red)
-        masks = []
-        for lower, upper in color_info["ranges"]:
-            mask = cv2.inRange(hsv_frame, lower, upper)
-            masks.append(mask)
+        cv2.ocl.setUseOpenCL(True)
+        self._use_opencl = True
+        print("⚡ OpenCL pipeline enabled (full-resolution mask, no blob filter)")
+        if self.temporal_filter:
+            print("⚠️  --temporal is not supported by the OpenCL pipeline - using morphology instead")
+        return True
+
+    def _allocate_buffers(self, height, width):
+        """Allocate the working buffers for frames of the given size"""
+        small_shape = (height // self.mask_scale, width // self.mask_scale)
         
-        # Combine all masks
-        final_mask = masks[0]
-        for mask in masks[1:]:
-            final_mask = cv2.bitwise_or(final_mask, mask)
+        self._flipped = np.empty((height, width, 3), np.uint8)
+        self._frame_small = np.empty(small_shape + (3,), np.uint8)
+        self._hsv = aligned_empty(small_shape + (3,))
+        self._hsv_planes = [np.empty(small_shape, np.uint8) for _ in range(3)]
+        self._mask_buf = np.empty(small_shape, np.uint8)
+        self._mask_tmp = np.empty(small_shape, np.uint8)
+        self._labels = np.empty(small_shape, np.int32)
+        self._refined_buf = np.empty(small_shape, np.uint8)
+        self._mask_prev = np.zeros(small_shape, np.uint8)
+        self._mask_ema = np.empty(small_shape, np.uint8)
+        self._mask_full = np.empty((height, width), np.uint8)
+        self._result = aligned_empty((height, width, 3))
         
-        return final_mask
+        probe_shape = (max(1, height // self.probe_scale), max(1, width // self.probe_scale))
+        self._probe_small = np.empty(probe_shape + (3,), np.uint8)
+        self._probe_hsv = np.empty(probe_shape + (3,), np.uint8)
+        self._probe_mask = np.empty(probe_shape, np.uint8)
+
+    def _ensure_buffers(self, frame):
+        """Re-allocate the working buffers if the frame size has changed"""
+        if self._flipped is None or self._flipped.shape != frame.shape:
+            self._allocate_buffers(*frame.shape[:2])
+
+    def _rebuild_mask_fn(self):
+        """Specialize the mask builder for the active HSV range(s)
+
+        Called only when the color changes (preset cycle, tuner toggle or
+        trackbar move), so the per-frame path does no lookups or branching.
+        """
+        hsv_range = self.hsv_tuner.get_hsv_range()
+        if hsv_range is not None:
+            ranges = [hsv_range]
+        else:
+            ranges = COLOR_PRESETS[self.color_names[self.current_color_index]]["ranges"]
+        
+        if self.use_numba:
+            # One fused pass over BGR, whatever the number of ranges
+            lowers, uppers = _stack_ranges(ranges)
+            bgr_range_mask = self._bgr_range_mask
+            
+            def mask_fn(frame, out):
+                return bgr_range_mask(frame, lowers, uppers, out)
+        elif _shares_sv_bounds(ranges):
+            # Split into H/S/V planes: single-channel tests vectorize far better
+            # than inRange over interleaved 3-channel pixels. All hue bands are
+            # folded into one 256-entry lookup table, so red needs no bitwise_or.
+            lut_h = np.zeros(256, np.uint8)
+            for lo, up in ranges:
+                lut_h[int(lo[0]):int(up[0]) + 1] = 255
+            s_min, s_max = int(ranges[0][0][1]), int(ranges[0][1][1])
+            v_min, v_max = int(ranges[0][0][2]), int(ranges[0][1][2])
+            
+            def mask_fn(frame, out):
+                hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=self._hsv)
+                h, s, v = cv2.split(hsv, self._hsv_planes)
+                cv2.LUT(h, lut_h, dst=out)
+                _plane_range(s, s_min, s_max, self._mask_tmp)
+                cv2.bitwise_and(out, self._mask_tmp, dst=out)
+                _plane_range(v, v_min, v_max, self._mask_tmp)
+                return cv2.bitwise_and(out, self._mask_tmp, dst=out)
+        else:
+            def mask_fn(frame, out):
+                hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV, dst=self._hsv)
+                return _union_of_ranges(hsv, ranges, out, self._mask_tmp)
+        
+        self._active_ranges = ranges
+        self._mask_fn = mask_fn
+
+    def create_color_mask(self, frame):
+        """Create binary mask for the current cloak color from a BGR frame"""
+        return self._mask_fn(frame, self._mask_buf)
+
+    def is_cloak_visible(self, frame):
+        """Coarse check for the cloak color on a heavily downsampled frame"""
+        small = cv2.resize(frame, self._probe_small.shape[1::-1], dst=self._probe_small,
+                           interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV, dst=self._probe_hsv)
+        
+        # A blob big enough to survive refine_mask covers at least this many probe pixels
+        min_pixels = max(1, self.min_blob_area // (self.probe_scale ** 2))
+        
+        count = 0
+        for lower, upper in self._active_ranges:
+            cv2.inRange(hsv, lower, upper, dst=self._probe_mask)
+            count += cv2.countNonZero(self._probe_mask)
+            if count >= min_pixels:
+                return True
+        return False
 
     def refine_mask(self, mask):
         """Clean up mask using morphological operations"""
-        # Remove noise with opening (erosion followed by dilation)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.morph_kernel, iterations=2)
+        # Remove noise with a single opening (separable erode + dilate)
+        cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.mask_morph_kernel, dst=mask)
         
-        # Fill small gaps with dilation
-        mask = cv2.dilate(mask, self.morph_kernel, iterations=1)
-        
-        # Optional: Remove small contours
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        for contour in contours:
-            if cv2.contourArea(contour) < 500:  # Remove small areas
-                cv2.fillPoly(mask, [contour], 0)
+        # Remove small blobs: label once, then map labels through a keep table
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(mask, labels=self._labels,
+                                                               connectivity=8,
+                                                               ltype=cv2.CV_32S)
+        min_area = self.min_blob_area // (self.mask_scale ** 2)
+        keep = np.where(stats[:, cv2.CC_STAT_AREA] >= min_area, 255, 0).astype(np.uint8)
+        keep[0] = 0  # Label 0 is the mask background
         
+        return np.take(keep, labels, out=self._refined_buf)
+
+    def smooth_mask(self, mask):
+        """Suppress single-frame speckle with a 1-tap temporal IIR filter
+
+        Blends the mask with the previous filtered mask and re-thresholds it,
+        so a pixel has to be set in consecutive frames to show up. Much
+        cheaper than refine_mask, but slower to react and it keeps blobs
+        that persist across frames.
+        """
+        cv2.addWeighted(mask, self.temporal_weight, self._mask_prev,
+                        1.0 - self.temporal_weight, 0, dst=self._mask_ema)
+        cv2.threshold(self._mask_ema, self.temporal_threshold - 1, 255, cv2.THRESH_BINARY,
+                      dst=mask)
+        self._mask_prev, self._mask_ema = self._mask_ema, self._mask_prev
         return mask
 
     def capture_background(self, num_frames=30):
@@ -265,12 +741,13 @@ class InvisibilityCloak:
         print("🟡 Capturing background... Please step out of the frame!")
         print("   This will take about 3 seconds...")
         
-        frames = []
+        accumulator = None
+        frame_count = 0
         countdown_frames = 60  # 2 seconds at 30fps for countdown
         
         # Countdown phase
         for i in range(countdown_frames):
-            ret, frame = self.cap.read()
+            ret, frame = self.grabber.read()
             if not ret:
                 continue
                 
@@ -296,12 +773,17 @@ class InvisibilityCloak:
         
         # Actual capture phase
         for i in range(num_frames):
-            ret, frame = self.cap.read()
+            ret, frame = self.grabber.read()
             if not ret:
                 continue
                 
             frame = cv2.flip(frame, 1)
-            frames.append(frame.astype(np.float32))
+            
+            # Running sum in a single float buffer instead of keeping every frame
+            if accumulator is None:
+                accumulator = np.zeros(frame.shape, np.float32)
+            cv2.accumulate(frame, accumulator)
+            frame_count += 1
             
             # Show progress
             progress = f"Capturing: {i+1}/{num_frames}"
@@ -310,10 +792,11 @@ class InvisibilityCloak:
             cv2.imshow("Invisibility Cloak", frame)
             cv2.waitKey(33)
         
-        if frames:
-            # Average all frames and apply slight blur
-            self.background = np.mean(frames, axis=0).astype(np.uint8)
-            self.background = cv2.GaussianBlur(self.background, (5, 5), 0)
+        if frame_count:
+            # Average all frames into an aligned buffer and apply slight blur
+            background = aligned_empty(accumulator.shape)
+            cv2.convertScaleAbs(accumulator, dst=background, alpha=1.0 / frame_count)
+            self.background = cv2.GaussianBlur(background, (5, 5), 0, dst=background)
             print("✅ Background captured successfully!")
             return True
         else:
@@ -323,9 +806,15 @@ class InvisibilityCloak:
     def cycle_color(self):
         """Cycle to next color preset"""
         self.current_color_index = (self.current_color_index + 1) % len(self.color_names)
+        self._rebuild_mask_fn()
         current_color = self.color_names[self.current_color_index]
         print(f"🎨 Switched to: {current_color} ({COLOR_PRESETS[current_color]['description']})")
 
+    def set_color(self, color_name):
+        """Select a color preset by name"""
+        self.current_color_index = self.color_names.index(color_name)
+        self._rebuild_mask_fn()
+
     def toggle_recording(self):
         """Start or stop video recording"""
         if not self.is_recording:
@@ -334,17 +823,19 @@ class InvisibilityCloak:
             filename = f"invisibility_cloak_{timestamp}.mp4"
             
             # Get frame dimensions
-            ret, frame = self.cap.read()
-            if not ret:
+            if self._flipped is None:
                 print("❌ Cannot start recording - no frame available")
                 return
             
-            height, width = frame.shape[:2]
+            height, width = self._flipped.shape[:2]
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
             
-            self.video_writer = cv2.VideoWriter(filename, fourcc, 30.0, (width, height))
+            video_writer = cv2.VideoWriter(filename, fourcc, 30.0, (width, height))
             
-            if self.video_writer.isOpened():
+            if video_writer.isOpened():
+                # Encode on a worker thread so recording doesn't stall the display
+                self.video_writer = RecordingWriter(video_writer)
+                self.video_writer.start()
                 self.is_recording = True
                 print(f"⏺️  Recording started: {filename}")
             else:
@@ -362,9 +853,6 @@ class InvisibilityCloak:
         """Draw heads-up display with status and controls"""
         height, width = frame.shape[:2]
         
-        # Semi-transparent background for text
-        overlay = frame.copy()
-        
         # Status information
         fps = self.fps_counter.get_fps()
         current_color = self.color_names[self.current_color_index]
@@ -386,7 +874,22 @@ class InvisibilityCloak:
             cv2.putText(frame, text, (10, 30 + i * 25), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
         
-        # Control instructions
+        # Control instructions: alpha-blit the pre-rendered layer (clipped to the frame)
+        layer_height, layer_width = self._static_hud.shape[:2]
+        rows = min(layer_height, height)
+        cols = min(layer_width, width)
+        roi = frame[height - rows:, :cols]
+        cv2.multiply(roi, self._static_hud_inv_alpha[layer_height - rows:, :cols],
+                     dst=roi, scale=1.0 / 255)
+        cv2.add(roi, self._static_hud_bgr[layer_height - rows:, :cols], dst=roi)
+
+    def _build_static_hud(self, layer_height=220, layer_width=300):
+        """Render the static control instructions once into a BGRA layer
+
+        The layer is anchored to the bottom-left corner of the frame. Text is
+        drawn antialiased onto black, so the color planes are already
+        premultiplied by the alpha channel.
+        """
         controls = [
             "Controls:",
             "B - Capture background",
@@ -398,38 +901,106 @@ class InvisibilityCloak:
             "Q/ESC - Quit"
         ]
         
+        self._static_hud = np.zeros((layer_height, layer_width, 4), np.uint8)
         for i, control in enumerate(controls):
-            y_pos = height - 200 + i * 20
-            color = (255, 255, 255) if i == 0 else (200, 200, 200)
+            y_pos = layer_height - 200 + i * 20
+            color = (255, 255, 255, 255) if i == 0 else (200, 200, 200, 255)
             font_scale = 0.6 if i == 0 else 0.5
-            cv2.putText(frame, control, (10, y_pos), 
+            cv2.putText(self._static_hud, control, (10, y_pos), 
                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, 1)
+        
+        # Contiguous premultiplied color and inverse-alpha planes for blending
+        self._static_hud_bgr = np.ascontiguousarray(self._static_hud[:, :, :3])
+        self._static_hud_inv_alpha = cv2.cvtColor(255 - self._static_hud[:, :, 3],
+                                                  cv2.COLOR_GRAY2BGR)
 
     def apply_invisibility_effect(self, frame):
         """Apply the main invisibility effect"""
         if self.background is None:
             return frame
         
-        # Convert to HSV for color detection
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        height, width = frame.shape[:2]
+        self._ensure_buffers(frame)
+        
+        # Most frames without the cloak need no mask or composite at all
+        if not self.is_cloak_visible(frame):
+            if self.temporal_filter:
+                self._mask_prev.fill(0)
+            return frame
+        
+        if self._gpu is not None:
+            return self._apply_invisibility_effect_gpu(frame)
+        
+        if self._use_opencl:
+            return self._apply_invisibility_effect_opencl(frame)
         
-        # Create and refine mask
-        mask = self.create_color_mask(hsv)
-        mask = self.refine_mask(mask)
+        # Build the mask at reduced resolution (it tolerates the aliasing)
+        if self.mask_scale > 1:
+            small = cv2.resize(frame, self._frame_small.shape[1::-1], dst=self._frame_small,
+                               interpolation=cv2.INTER_AREA)
+        else:
+            small = frame
+        
+        # Create and clean up mask, then upsample it back to frame resolution.
+        # Tuning wants immediate single-frame feedback, so it keeps morphology.
+        mask = self.create_color_mask(small)
+        if self.temporal_filter and not self.hsv_tuner.is_active:
+            mask = self.smooth_mask(mask)
+        else:
+            mask = self.refine_mask(mask)
+        if self.mask_scale > 1:
+            mask = cv2.resize(mask, (width, height), dst=self._mask_full,
+                              interpolation=cv2.INTER_NEAREST)
+        
+        # Composite background into the cloak area in a single pass
+        if cloak_kernels is not None:
+            return cloak_kernels.composite(frame, self.background, mask, self._result)
+        
+        np.copyto(self._result, frame)
+        cv2.copyTo(self.background, mask, self._result)
+        return self._result
+
+    def _apply_invisibility_effect_gpu(self, frame):
+        """CUDA version of the effect: one upload, one download per frame"""
+        gpu = self._gpu
+        
+        # Upload the background only when it changes
+        if self._gpu_background is not self.background:
+            gpu["background"].upload(self.background)
+            self._gpu_background = self.background
+        
+        gpu["frame"].upload(frame)
+        cv2.cuda.cvtColor(gpu["frame"], cv2.COLOR_BGR2HSV, dst=gpu["hsv"])
         
-        # Create inverse mask
-        inv_mask = cv2.bitwise_not(mask)
+        # Color mask from the active range(s)
+        _union_of_ranges(gpu["hsv"], self._active_ranges, gpu["mask"], gpu["mask_tmp"],
+                         in_range=_cuda_in_range, bitwise_or=cv2.cuda.bitwise_or)
         
-        # Extract cloak area from background
-        background_part = cv2.bitwise_and(self.background, self.background, mask=mask)
+        # Noise removal and compositing
+        self._gpu_morph.apply(gpu["mask"], dst=gpu["refined"])
+        gpu["frame"].copyTo(dst=gpu["result"])
+        gpu["background"].copyTo(mask=gpu["refined"], dst=gpu["result"])
         
-        # Extract non-cloak area from current frame
-        frame_part = cv2.bitwise_and(frame, frame, mask=inv_mask)
+        return gpu["result"].download(dst=self._result)
+
+    def _apply_invisibility_effect_opencl(self, frame):
+        """OpenCL version of the effect: UMat end to end, one download per frame"""
+        # Upload the background only when it changes
+        if self._umat_background_source is not self.background:
+            self._umat_background = cv2.UMat(self.background)
+            self._umat_background_source = self.background
+        
+        umat_frame = cv2.UMat(frame)
+        hsv = cv2.cvtColor(umat_frame, cv2.COLOR_BGR2HSV)
         
-        # Combine both parts
-        result = cv2.add(background_part, frame_part)
+        # Color mask from the active range(s)
+        mask = _union_of_ranges(hsv, self._active_ranges)
         
-        return result
+        # Noise removal and compositing on the device
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, self.morph_kernel5)
+        result = cv2.copyTo(self._umat_background, mask, dst=umat_frame)
+        
+        return result.get()
 
     def run(self):
         """Main application loop"""
@@ -445,13 +1016,14 @@ class InvisibilityCloak:
         
         try:
             while True:
-                ret, frame = self.cap.read()
+                ret, frame = self.grabber.read()
                 if not ret:
                     print("⚠️  Failed to read frame from camera")
                     break
                 
                 # Mirror the frame for natural webcam experience
-                frame = cv2.flip(frame, 1)
+                self._ensure_buffers(frame)
+                frame = cv2.flip(frame, 1, dst=self._flipped)
                 
                 # Update FPS counter
                 self.fps_counter.update()
@@ -502,6 +1074,9 @@ class InvisibilityCloak:
         if self.is_recording and self.video_writer:
             self.video_writer.release()
         
+        if self.grabber:
+            self.grabber.stop()
+        
         if self.cap:
             self.cap.release()
         
@@ -522,6 +1097,9 @@ Examples:
   python invisibility_cloak.py --cam 1            # Use camera 1
   python invisibility_cloak.py --color blue       # Start with blue preset
   python invisibility_cloak.py --width 640 --height 480  # Lower resolution
+  python invisibility_cloak.py --temporal         # Cheaper temporal mask smoothing
+  python invisibility_cloak.py --opencl           # Run the effect through OpenCL
+  python invisibility_cloak.py --gpu              # Run the effect on a CUDA GPU
         """
     )
     
@@ -545,6 +1123,22 @@ Examples:
                        default=720,
                        help='Camera height (default: 720)')
     
+    parser.add_argument('--temporal', 
+                       action='store_true',
+                       help='Suppress mask flicker with a temporal filter instead of morphology')
+    
+    parser.add_argument('--opencl', 
+                       action='store_true',
+                       help='Run the effect through OpenCL (UMat), e.g. on an integrated GPU')
+    
+    parser.add_argument('--numba', 
+                       action='store_true',
+                       help='Build the color mask with the experimental fused Numba kernel')
+    
+    parser.add_argument('--gpu', 
+                       action='store_true',
+                       help='Run the effect on a CUDA device via cv2.cuda (needs a CUDA build of OpenCV)')
+    
     args = parser.parse_args()
     
     try:
@@ -552,12 +1146,16 @@ Examples:
         cloak = InvisibilityCloak(
             camera_index=args.cam,
             width=args.width,
-            height=args.height
+            height=args.height,
+            use_gpu=args.gpu,
+            temporal_filter=args.temporal,
+            use_opencl=args.opencl,
+            use_numba=args.numba
         )
         
         # Set initial color
         if args.color in COLOR_PRESETS:
-            cloak.current_color_index = list(COLOR_PRESETS.keys()).index(args.color)
+            cloak.set_color(args.color)
         
         # Run the application
         cloak.run()